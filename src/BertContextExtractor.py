@@ -1,10 +1,17 @@
-from transformers import pipeline
+from gpu_check import get_profile
+from modelRegistry import get_registry
 
 class BertContextExtractor:
     def __init__(self):
-        # Hugging Face pipeline for question answering
-        self.qa_pipeline = pipeline("question-answering", model="timpal0l/mdeberta-v3-base-squad2")
-    
+        # Hugging Face pipeline for question answering, shared through the model registry.
+        # Only held during extract() so the registry can unload it when idle. Load it now
+        self.registry = get_registry()
+        self.device = get_profile()["device"]
+        self.registry.release(self._qa_pipeline())
+
+    def _qa_pipeline(self):
+        return self.registry.pipeline("question-answering", "timpal0l/mdeberta-v3-base-squad2", device=self.device)
+
     def extract(self, context):
         # context will be a string of text
 
@@ -19,15 +26,19 @@ class BertContextExtractor:
         # Store the results in a dictionary
         results = {}
 
-        # Loop through the intents and ask the model each question
-        for key, question in intents.items():
-            # ask the model the question
-            answer = self.qa_pipeline(question=question, context=context)
-
-            # if the answer score is greater than 0.3, add it to the results
-            # print(answer['score'])
-            if answer["score"] > 0.3:
-                results[key] = answer["answer"]
+        qa_pipeline = self._qa_pipeline()
+        try:
+            # Loop through the intents and ask the model each question
+            for key, question in intents.items():
+                # ask the model the question
+                answer = qa_pipeline(question=question, context=context)
+
+                # if the answer score is greater than 0.3, add it to the results
+                # print(answer['score'])
+                if answer["score"] > 0.3:
+                    results[key] = answer["answer"]
+        finally:
+            self.registry.release(qa_pipeline)
 
         # results will be a dict with keys "intent", "object", "direction", or "character", with the values being the answers from the model
         return results
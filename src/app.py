@@ -3,7 +3,15 @@ from textual.widgets import ListView, ListItem, Input, Static, LoadingIndicator,
 from textual.binding import Binding
 from textual.screen import Screen
 from chatbot import ChatBot
+from metrics import LatencyTracker
+from modelRegistry import get_registry
+import argparse
 import asyncio
+import os
+import time
+
+# How often the UI loop is sampled to measure frame latency (seconds)
+FRAME_INTERVAL = 1 / 30
 
 
 class SelectionScreen(Screen[int]):
@@ -94,6 +102,12 @@ class TextPagerApp(App[None]):
         self.current_index = 0
         self.chatbot = chatbot
 
+        # How late each UI tick fires while a turn is running, and how long each turn takes end to end
+        self.frame_latency = LatencyTracker("UI frame delay during turns")
+        self.turn_latency = LatencyTracker("Turn latency", unit="s")
+        self.last_tick = time.perf_counter()
+        self.turn_running = False
+
     def compose(self) -> ComposeResult:
         page = self.pages[self.current_index]
         if isinstance(page, dict):
@@ -126,6 +140,17 @@ class TextPagerApp(App[None]):
         self.query_one(LoadingIndicator).display = False
         self.update_view()
         self.set_focus(self.query_one(Input))
+        self.last_tick = time.perf_counter()
+        self.set_interval(FRAME_INTERVAL, self.measure_frame)
+
+    def measure_frame(self) -> None:
+        # If the event loop is starved (GIL held by model work) ticks arrive late.
+        # Idle ticks while the player types would only dilute the numbers, so only turns count
+        now = time.perf_counter()
+        if self.turn_running:
+            delay = (now - self.last_tick - FRAME_INTERVAL) * 1000
+            self.frame_latency.record(max(0.0, delay))
+        self.last_tick = now
 
     def update_view(self) -> None:
         page = self.pages[self.current_index]
@@ -168,11 +193,14 @@ class TextPagerApp(App[None]):
         spinner = self.query_one(LoadingIndicator)
         spinner.display = True
         self.refresh(layout=True)
+        self.turn_running = True
         try:
-            _, response = await asyncio.to_thread(self.chatbot.prompt, prompt)
+            with self.turn_latency.time():
+                _, response = await asyncio.to_thread(self.chatbot.prompt, prompt)
         except Exception as err:
             response = f"[red]Error:[/] {err}"
         finally:
+            self.turn_running = False
             spinner.display = False
         spinner.display = False
         last_index = len(self.pages) - 1
@@ -192,6 +220,35 @@ class TextPagerApp(App[None]):
         response = await self.helper(prompt)
 
 if __name__ == "__main__":
-    chatbot = ChatBot()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--worker", action="store_true",
+                        help="run the summarizer, embedder and FAISS in a separate process")
+    parser.add_argument("--worker-timeout", type=float, default=None,
+                        help="seconds a worker call may take before the worker is restarted (default 120)")
+    parser.add_argument("--model-idle-timeout", type=float, default=None,
+                        help="unload models that have not been used for this many seconds")
+    parser.add_argument("--model-memory-budget", type=float, default=None,
+                        help="keep model weights in RAM under this many MB")
+    args = parser.parse_args()
+
+    # Passed through the environment so the worker process picks them up too
+    if args.model_idle_timeout is not None:
+        os.environ["STORYTELLER_MODEL_IDLE_TIMEOUT"] = str(args.model_idle_timeout)
+    if args.model_memory_budget is not None:
+        os.environ["STORYTELLER_MODEL_MEMORY_BUDGET_MB"] = str(args.model_memory_budget)
+
+    chatbot = ChatBot(use_worker=args.worker, worker_timeout=args.worker_timeout)
     app = TextPagerApp(chatbot=chatbot)
-    app.run()
+    try:
+        app.run()
+    finally:
+        if not args.worker:
+            # In worker mode the models live in the other process
+            get_registry().print_report()
+        chatbot.close()
+
+    mode = "worker process" if args.worker else "in-process threads"
+    print(f"Latency ({mode}):")
+    print(app.frame_latency.report())
+    print(app.turn_latency.report())
+    print(chatbot.governor.report())
@@ -3,21 +3,37 @@ import os
 import subprocess
 from huggingface_hub import hf_hub_download
 
+from gpu_check import get_profile
+from responseGovernor import ResponseGovernor
 from vectorDB import VectorDB
 
 class ChatBot():
 
-    def __init__(self):
+    def __init__(self, use_worker=False, worker_timeout=None):
         model_path = self.load_model()
         self.model_alias = "Pygmalion-3-12B-Q3_K.gguf"
         self.chat_history = []
-        self.vdb = VectorDB()
+        # Hardware tuning profile, decides Ollama GPU offload and threads
+        self.profile = get_profile()
+        # Per-turn token budgets and stop sequences for generation
+        self.governor = ResponseGovernor()
+        if use_worker:
+            # Host summarizer/embedder/FAISS in a separate process so they don't hold the UI's GIL
+            from vectorWorker import VectorDBWorker, DEFAULT_CALL_TIMEOUT
+            self.vdb = VectorDBWorker(call_timeout=worker_timeout or DEFAULT_CALL_TIMEOUT)
+        else:
+            self.vdb = VectorDB()
         self.ensure_model(model_path)
 
     def prompt(self, prompt):
         response = self.generate_response(prompt)
         return prompt, response
 
+    def close(self):
+        # Frees the index and removes its side file, or shuts down the worker process.
+        # Models are released after every call, the registry unloads them
+        self.vdb.close()
+
     def load_model(self):
         print("Loading model...")
 
@@ -70,6 +86,9 @@ class ChatBot():
 
 
     def generate_response(self, prompt: str) -> str:
+        # Detect the intent from the raw player input, before relevant info is added
+        intent = self.governor.detect_intent(prompt, first_turn=len(self.chat_history) == 0)
+
         relevant_list = self.vdb.query(prompt)
         relevant_info = ""
         if len(relevant_list) > 0:
@@ -79,28 +98,29 @@ class ChatBot():
         prompt = f"Prompt from user: {prompt}{relevant_info}"
         message = {"role": "user", "content": prompt}
 
-        resp = chat(
+        stream = chat(
             model=self.model_alias,
             messages=[*self.chat_history, message],
             options={
-                "gpu_layers": 99,  # Use as many layers on GPU as possible
+                **self.profile["ollama_options"],  # GPU layers / threads from the tuning profile
                 "temperature": 0.7,
                 "top_p": 0.9,
-                "num_predict": 2048  # Max tokens to generate
-            }
+                **self.governor.options(intent)  # Max tokens and stop sequences for this intent
+            },
+            stream=True
         )
 
-        assistant_message = resp['message']
+        # Streamed so the governor can end the turn at a sentence boundary
+        content = self.governor.collect(stream, intent)
 
-        if 'role' not in assistant_message or assistant_message['role'] != 'assistant':
-            assistant_message = {
-                "role": "assistant",
-                "content": assistant_message['content']
-            }
+        assistant_message = {
+            "role": "assistant",
+            "content": content
+        }
 
         self.vdb.add_text(assistant_message["content"])
 
         self.chat_history.append(message)
         self.chat_history.append(assistant_message)
 
-        return resp['message']['content'].strip() # + f"\nRelevant info: {relevant_info}"
+        return content.strip() # + f"\nRelevant info: {relevant_info}"
@@ -0,0 +1,292 @@
+from array import array
+import os
+import re
+import shutil
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+# flat:  float32 vectors, exact search (the original behaviour)
+# fp16:  float16 vectors, half the memory
+# sq8:   8-bit scalar quantized vectors, a quarter of the memory
+# ivfpq: IVF + product quantization codes in memory, exact vectors in a memory-mapped
+#        side file used to re-rank the candidates
+STORAGE_MODES = ("flat", "fp16", "sq8", "ivfpq")
+
+# Temp files and dirs are named storyteller-<kind>-<owner pid>-... so leftovers from a
+# process that was killed can be found and removed
+STALE_NAME = re.compile(r"^storyteller-(vectors|worker)-(\d+)-")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # exists but belongs to someone else, or we can't tell
+        return True
+    return True
+
+
+def remove_stale_files(directory=None):
+    '''Deletes side files and worker dirs in the temp dir whose owning process is gone'''
+    directory = directory or tempfile.gettempdir()
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        match = STALE_NAME.match(name)
+        if match is None or _pid_alive(int(match.group(2))):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+class PackedStrings:
+    '''List of strings stored as one UTF-8 buffer plus an offsets array.
+    Avoids the ~50 bytes of object overhead per Python str for long campaigns.
+    Supports len(), indexing, iteration, append and extend like a list.'''
+
+    def __init__(self, items=()):
+        self.buffer = bytearray()
+        # offsets[i] and offsets[i + 1] are the start and end of item i
+        self.offsets = array('q', [0])
+        self.extend(items)
+
+    def append(self, text):
+        self.buffer += text.encode('utf-8')
+        self.offsets.append(len(self.buffer))
+
+    def extend(self, items):
+        for text in items:
+            self.append(text)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        n = len(self)
+        if i < 0:
+            i += n
+        if i < 0 or i >= n:
+            raise IndexError("PackedStrings index out of range")
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def nbytes(self):
+        return len(self.buffer) + self.offsets.itemsize * len(self.offsets)
+
+
+class VectorFile:
+    '''Append-only float32 matrix kept in a memory-mapped file, so the exact vectors
+    live in the page cache instead of the Python heap'''
+
+    def __init__(self, dim, path=None, capacity=1024):
+        self.dim = dim
+        self.temporary = path is None
+        if path is None:
+            remove_stale_files()
+            fd, path = tempfile.mkstemp(prefix=f"storyteller-vectors-{os.getpid()}-", suffix=".f32")
+            os.close(fd)
+        self.path = path
+        # Start from an empty file, the index is rebuilt every session
+        open(self.path, 'wb').close()
+        self.count = 0
+        self.map = None
+        self._resize(capacity)
+
+    def _resize(self, capacity):
+        if self.map is not None:
+            self.map.flush()
+            self.map = None
+        with open(self.path, 'r+b') as f:
+            f.truncate(capacity * self.dim * 4)
+        self.map = np.memmap(self.path, dtype='float32', mode='r+', shape=(capacity, self.dim))
+        self.capacity = capacity
+
+    def append(self, vectors):
+        n = len(vectors)
+        if self.count + n > self.capacity:
+            capacity = self.capacity
+            while self.count + n > capacity:
+                capacity *= 2
+            self._resize(capacity)
+        self.map[self.count:self.count + n] = vectors
+        self.count += n
+
+    def get(self, ids):
+        return np.asarray(self.map[ids])
+
+    def view(self):
+        return self.map[:self.count]
+
+    def close(self):
+        self.map = None
+        if self.temporary and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class EmbeddingIndex:
+    '''FAISS index wrapper with a selectable storage mode (see STORAGE_MODES).
+    add() and search() behave like the FAISS index methods.
+    sq8 learns each dimension's range from the first train_size vectors, which are kept
+    exact (float32) until then.'''
+
+    def __init__(self, dim, storage="flat", use_gpu=False, nlist=64, m=48, rerank=20,
+                 train_size=None, vector_path=None):
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode '{storage}', expected one of {STORAGE_MODES}")
+        self.dim = dim
+        self.storage = storage
+        self.vectors = None
+        self.staging = None
+        self.res = None
+
+        if storage == "flat":
+            if use_gpu:
+                self.res = faiss.StandardGpuResources()
+                self.index = faiss.GpuIndexFlatL2(self.res, dim)
+            else:
+                self.index = faiss.IndexFlatL2(dim)
+        elif storage == "fp16":
+            self.index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16)
+        elif storage == "sq8":
+            self.index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit)
+            # MiniLM components mostly sit well inside [-1, 1], so the 8-bit range is learned
+            # from real vectors. Until there are enough, they are kept in an exact flat index
+            self.train_size = train_size if train_size is not None else 1000
+            self.staging = faiss.IndexFlatL2(dim)
+        else:
+            self.nlist = nlist
+            self.rerank = rerank
+            # FAISS wants ~39 training points per centroid (nlist for IVF, 256 per PQ sub-quantizer).
+            # Until then searches brute force over the side file, which is fast at that size
+            self.train_size = train_size if train_size is not None else 39 * max(256, nlist)
+            self.quantizer = faiss.IndexFlatL2(dim)
+            self.index = faiss.IndexIVFPQ(self.quantizer, dim, nlist, m, 8)
+            self.index.nprobe = min(nlist, 8)
+            self.vectors = VectorFile(dim, path=vector_path)
+
+    def __len__(self):
+        if self.vectors is not None:
+            return self.vectors.count
+        if self.staging is not None:
+            return self.staging.ntotal
+        return self.index.ntotal
+
+    def add(self, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        if self.staging is not None:
+            self.staging.add(vectors)
+            if self.staging.ntotal >= self.train_size:
+                # Enough data to learn the ranges, move everything into the quantized index
+                stored = self.staging.reconstruct_n(0, self.staging.ntotal)
+                self.index.train(stored)
+                self.index.add(stored)
+                self.staging = None
+            return
+        if self.vectors is None:
+            self.index.add(vectors)
+            return
+
+        self.vectors.append(vectors)
+        if self.index.is_trained:
+            self.index.add(vectors)
+        elif self.vectors.count >= self.train_size:
+            # Enough data to train, index everything stored so far
+            stored = np.ascontiguousarray(self.vectors.view())
+            self.index.train(stored)
+            self.index.add(stored)
+
+    def search(self, queries, k):
+        queries = np.ascontiguousarray(queries, dtype='float32')
+        if self.staging is not None:
+            return self.staging.search(queries, k)
+        if self.vectors is None:
+            return self.index.search(queries, k)
+
+        if not self.index.is_trained:
+            # Until the index is trained, brute force over the side file
+            candidates = np.tile(np.arange(self.vectors.count), (len(queries), 1))
+        else:
+            _, candidates = self.index.search(queries, k * self.rerank)
+        return self._rerank(queries, candidates, k)
+
+    def _rerank(self, queries, candidates, k):
+        D = np.full((len(queries), k), np.inf, dtype='float32')
+        I = np.full((len(queries), k), -1, dtype='int64')
+        for row, (query, ids) in enumerate(zip(queries, candidates)):
+            ids = ids[ids >= 0]
+            if len(ids) == 0:
+                continue
+            exact = self.vectors.get(ids)
+            dist = ((exact - query) ** 2).sum(axis=1)
+            order = np.argsort(dist)[:k]
+            D[row, :len(order)] = dist[order]
+            I[row, :len(order)] = ids[order]
+        return D, I
+
+    def memory_bytes(self):
+        '''Bytes the index holds in RAM (the ivfpq side file is not counted, see disk_bytes)'''
+        if self.res is not None:
+            # GPU flat index stores the raw float32 vectors
+            return self.index.ntotal * self.dim * 4
+        if self.staging is not None:
+            return faiss.serialize_index(self.staging).nbytes
+        return faiss.serialize_index(self.index).nbytes
+
+    def disk_bytes(self):
+        return self.vectors.count * self.dim * 4 if self.vectors is not None else 0
+
+    def close(self):
+        if self.vectors is not None:
+            self.vectors.close()
+
+
+if __name__ == "__main__":
+    # Compare the storage modes on synthetic clustered, normalized embeddings
+    rng = np.random.default_rng(0)
+    dim, n, n_queries, k = 384, 20000, 200, 3
+
+    centers = rng.normal(size=(200, dim))
+    data = centers[rng.integers(0, len(centers), n)] + 0.5 * rng.normal(size=(n, dim))
+    data = (data / np.linalg.norm(data, axis=1, keepdims=True)).astype('float32')
+    queries = data[rng.integers(0, n, n_queries)] + 0.05 * rng.normal(size=(n_queries, dim))
+    queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype('float32')
+
+    exact = EmbeddingIndex(dim, "flat")
+    exact.add(data)
+    _, truth = exact.search(queries, k)
+
+    print(f"{n} entries, {n_queries} queries, k={k}")
+    print(f"{'mode':<8}{'RAM B/entry':>14}{'disk B/entry':>14}{f'recall@{k}':>12}{'query ms':>12}")
+    for storage in STORAGE_MODES:
+        index = EmbeddingIndex(dim, storage)
+        index.add(data)
+        start = time.perf_counter()
+        _, found = index.search(queries, k)
+        latency = (time.perf_counter() - start) * 1000 / n_queries
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+        print(f"{storage:<8}{index.memory_bytes() / n:>14.1f}{index.disk_bytes() / n:>14.1f}"
+              f"{recall:>12.3f}{latency:>12.3f}")
+        index.close()
+
+    # Summaries: list of str vs packed buffer
+    import sys
+    texts = [f"The party met a stranger near the old mill, turn {i}." for i in range(n)]
+    list_bytes = sys.getsizeof(texts) + sum(sys.getsizeof(t) for t in texts)
+    packed = PackedStrings(texts)
+    print(f"summaries: list of str {list_bytes / n:.1f} B/entry, packed {packed.nbytes() / n:.1f} B/entry")
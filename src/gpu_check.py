@@ -1,10 +1,22 @@
 """
 Simple script to check for GPU support in your environment.
 Run this script to verify if your system has GPU support properly configured.
+
+It also detects hardware capabilities and builds a tuning profile (thread counts,
+batch sizes, index backend, device placement and Ollama options) that the chatbot
+and vector DB apply at startup. Thread counts are calibrated with a short benchmark on
+first start; the other settings follow from the detected hardware. The profile is cached
+in ~/.dl-storyteller/tuning_profile.json. Values in ~/.dl-storyteller/tuning_override.json
+(or the file named by STORYTELLER_TUNING_OVERRIDE) replace the calibrated ones.
+
+Run with --profile to print the chosen profile, or --recalibrate to rebuild it.
 """
 
 import platform
 import os
+import json
+import sys
+import time
 
 def check_system():
     """Print basic system information"""
@@ -161,7 +173,220 @@ def check_ollama():
     
     print("\n" + "="*50)
 
+PROFILE_DIR = os.path.expanduser("~/.dl-storyteller")
+PROFILE_PATH = os.path.join(PROFILE_DIR, "tuning_profile.json")
+OVERRIDE_PATH = os.environ.get("STORYTELLER_TUNING_OVERRIDE",
+                               os.path.join(PROFILE_DIR, "tuning_override.json"))
+
+# Bump when the profile layout changes so old caches get recalibrated
+PROFILE_VERSION = 1
+
+# Seconds to wait for nvidia-smi before treating the machine as having no GPU
+NVIDIA_SMI_TIMEOUT = 5
+
+# Profile for this process, loaded and applied once by get_profile()
+_profile = None
+
+def _query_gpus():
+    """List GPUs through nvidia-smi. Asking torch would start a CUDA context in this
+    process, which holds GPU memory next to the Ollama model for the whole session"""
+    import subprocess
+    try:
+        # A stuck driver can hang nvidia-smi, don't let it hang startup
+        result = subprocess.run(['nvidia-smi', '--query-gpu=name,memory.total', '--format=csv,noheader,nounits'],
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                text=True,
+                                timeout=NVIDIA_SMI_TIMEOUT)
+    except (FileNotFoundError, OSError, subprocess.TimeoutExpired):
+        return []
+    if result.returncode != 0:
+        return []
+
+    gpus = []
+    for line in result.stdout.strip().splitlines():
+        # Skip rows that don't parse, e.g. memory reported as [N/A] or [Not Supported]
+        try:
+            name, memory_mb = [part.strip() for part in line.rsplit(',', 1)]
+            gpus.append({"name": name, "memory_gb": round(float(memory_mb) / 1024, 1)})
+        except ValueError:
+            continue
+    return gpus
+
+def detect_capabilities():
+    """Return a dict describing the CPU, GPU and libraries available
+    Nothing here touches CUDA, so it is safe to run in the UI process"""
+    caps = {
+        "platform": f"{platform.system()} {platform.machine()}",
+        "cpu_logical": os.cpu_count() or 1,
+        "cpu_physical": None,
+        "ram_gb": None,
+        "cuda": False,
+        "gpus": [],
+        "faiss_gpus": 0,
+    }
+
+    try:
+        import psutil
+        caps["cpu_physical"] = psutil.cpu_count(logical=False)
+        caps["ram_gb"] = round(psutil.virtual_memory().total / 1024**3, 1)
+    except ImportError:
+        pass
+    if not caps["cpu_physical"]:
+        caps["cpu_physical"] = caps["cpu_logical"]
+
+    caps["gpus"] = _query_gpus()
+
+    try:
+        import torch
+        # A CUDA build of torch plus a visible GPU. torch.version.cuda doesn't initialize CUDA
+        caps["cuda"] = torch.version.cuda is not None and len(caps["gpus"]) > 0
+    except ImportError:
+        pass
+
+    try:
+        import faiss
+        # CPU builds of faiss have no GPU index classes
+        if hasattr(faiss, "StandardGpuResources"):
+            caps["faiss_gpus"] = len(caps["gpus"])
+    except ImportError:
+        pass
+
+    return caps
+
+def _time_matmul(batch, threads, repeats=5):
+    """Seconds per (batch x 384) @ (384 x 1536) matmul, roughly one MiniLM feed-forward layer"""
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        a = torch.randn(batch, 384)
+        b = torch.randn(384, 1536)
+        matmul = torch.matmul
+    except ImportError:
+        import numpy as np
+        a = np.random.rand(batch, 384).astype("float32")
+        b = np.random.rand(384, 1536).astype("float32")
+        matmul = np.matmul
+
+    matmul(a, b)  # warm up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        matmul(a, b)
+    return (time.perf_counter() - start) / repeats
+
+def calibrate(caps):
+    """Run a short microbenchmark and return a tuning profile for this machine"""
+    print("Calibrating tuning profile...")
+
+    # Thread count: try a few and keep the fastest
+    physical = caps["cpu_physical"]
+    candidates = sorted({1, max(1, physical // 2), physical})
+    timings = {threads: _time_matmul(64, threads) for threads in candidates}
+    threads = min(timings, key=timings.get)
+
+    # Embedding batch size is not calibrated, it only matters for batched encodes
+    # (replaying summaries after a worker restart, the worker's encode command).
+    # sentence-transformers' default of 32 suits a CPU, a GPU takes larger batches
+    device = "cuda" if caps["cuda"] else "cpu"
+    batch_size = 64 if caps["cuda"] else 32
+
+    return {
+        "version": PROFILE_VERSION,
+        "capabilities": caps,
+        "device": device,
+        "torch_threads": threads,
+        "faiss_threads": threads,
+        "embed_batch_size": batch_size,
+        "index_backend": "faiss-gpu" if caps["faiss_gpus"] > 0 else "faiss-cpu",
+        # flat, fp16, sq8 or ivfpq, see embeddingStore.py. Compressed modes save RAM on long campaigns
+        "embedding_storage": "flat",
+        # Model registry: unload unused models after this many seconds / keep them under this many MB.
+        # None disables it
+        "model_idle_timeout": None,
+        "model_memory_budget_mb": None,
+        # Ollama detects CUDA itself (torch isn't involved), so offload whenever nvidia-smi sees
+        # a GPU. num_gpu is the number of layers it offloads, 99 means all of them.
+        # Without a GPU it is left out so Ollama decides
+        "ollama_options": {"num_gpu": 99} if caps["gpus"] else {},
+        "calibration_ms": {str(t): round(s * 1000, 3) for t, s in timings.items()},
+    }
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: could not read {path}: {e}")
+        return None
+
+def load_profile(recalibrate=False):
+    """Return the cached profile (calibrating if needed) with overrides applied"""
+    caps = detect_capabilities()
+    profile = None if recalibrate else _read_json(PROFILE_PATH)
+
+    # Recalibrate when there is no cache or the hardware changed
+    if profile is None or profile.get("version") != PROFILE_VERSION or profile.get("capabilities") != caps:
+        profile = calibrate(caps)
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            with open(PROFILE_PATH, "w", encoding="utf-8") as f:
+                json.dump(profile, f, indent=2)
+        except OSError as e:
+            print(f"Warning: could not cache tuning profile: {e}")
+
+    override = _read_json(OVERRIDE_PATH)
+    if override:
+        for key, value in override.items():
+            if isinstance(value, dict) and isinstance(profile.get(key), dict):
+                profile[key] = {**profile[key], **value}
+            else:
+                profile[key] = value
+
+    # Never place work on hardware that isn't there, even if an override asks for it
+    if not caps["cuda"]:
+        profile["device"] = "cpu"
+    if caps["faiss_gpus"] == 0:
+        profile["index_backend"] = "faiss-cpu"
+
+    return profile
+
+def apply_profile(profile):
+    """Set process-wide thread counts from the profile"""
+    os.environ.setdefault("OMP_NUM_THREADS", str(profile["torch_threads"]))
+    try:
+        import torch
+        torch.set_num_threads(profile["torch_threads"])
+    except ImportError:
+        pass
+    try:
+        import faiss
+        faiss.omp_set_num_threads(profile["faiss_threads"])
+    except ImportError:
+        pass
+
+def get_profile():
+    """Load and apply the tuning profile once per process, then return it"""
+    global _profile
+    if _profile is None:
+        _profile = load_profile()
+        apply_profile(_profile)
+    return _profile
+
+def print_profile(profile):
+    """Print the chosen profile"""
+    print("TUNING PROFILE")
+    print("="*50)
+    print(json.dumps(profile, indent=2))
+    print(f"\nCache: {PROFILE_PATH}")
+    print(f"Override: {OVERRIDE_PATH}" + ("" if os.path.exists(OVERRIDE_PATH) else " (not present)"))
+
 if __name__ == "__main__":
+    if "--profile" in sys.argv or "--recalibrate" in sys.argv:
+        print_profile(load_profile(recalibrate="--recalibrate" in sys.argv))
+        sys.exit(0)
+
     print("\nGPU SUPPORT CHECKER")
     print("="*50)
     
@@ -0,0 +1,57 @@
+import time
+
+
+class LatencyTracker:
+    '''Keeps a running list of measurements (e.g. seconds per turn) and
+    summarizes them as count / mean / percentiles / max'''
+
+    def __init__(self, name, unit="ms"):
+        self.name = name
+        self.unit = unit
+        self.values = []
+
+    def record(self, value):
+        self.values.append(value)
+
+    def time(self):
+        '''Context manager that records how long the block took, in the tracker's unit'''
+        return _Timer(self)
+
+    def percentile(self, pct):
+        # nearest-rank percentile, good enough for a handful of turns
+        if len(self.values) == 0:
+            return 0.0
+        ordered = sorted(self.values)
+        rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+        return ordered[rank]
+
+    def summary(self):
+        '''Returns a dict with count, mean, p50, p95 and max'''
+        count = len(self.values)
+        return {
+            "count": count,
+            "mean": sum(self.values) / count if count > 0 else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "max": max(self.values) if count > 0 else 0.0,
+        }
+
+    def report(self):
+        s = self.summary()
+        return (f"{self.name}: n={s['count']} mean={s['mean']:.1f}{self.unit} "
+                f"p50={s['p50']:.1f}{self.unit} p95={s['p95']:.1f}{self.unit} max={s['max']:.1f}{self.unit}")
+
+
+class _Timer:
+    def __init__(self, tracker):
+        self.tracker = tracker
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        scale = 1000.0 if self.tracker.unit == "ms" else 1.0
+        self.tracker.record(elapsed * scale)
+        return False
@@ -0,0 +1,259 @@
+import gc
+import os
+import threading
+import time
+
+
+class _Entry:
+    def __init__(self, key, instance, weight_bytes, device):
+        self.key = key
+        self.instance = instance
+        # Size of the weights and where they live, see _model_weights
+        self.weight_bytes = weight_bytes
+        self.device = device
+        self.refs = 0
+        self.last_used = time.monotonic()
+
+
+class ModelRegistry:
+    '''Process-wide cache of loaded models so the same checkpoint is only loaded once.
+    Models are keyed by (kind, model name, task, dtype, device) and reference counted.
+    A model with no references is unloaded once it has been idle for idle_timeout
+    seconds, or earlier if loading something else pushes the weights held in RAM over
+    memory_budget bytes. Weights on a GPU are reported but don't count against the budget.
+    Only weights are counted, not activations, tokenizers or allocator overhead.
+    Models that are still referenced are never unloaded, so components acquire a model for
+    the duration of a call and release it afterwards.'''
+
+    def __init__(self, idle_timeout=None, memory_budget=None):
+        self.idle_timeout = idle_timeout
+        self.memory_budget = memory_budget
+        self.entries = {}
+        # key -> Event set when the thread loading that key is done. Loading happens outside
+        # self.lock so a slow load only blocks other acquires of the same key
+        self.loading = {}
+        self.lock = threading.RLock()
+
+        # Idle models also need unloading when nothing else touches the registry
+        if idle_timeout is not None:
+            sweeper = threading.Thread(target=self._sweep_loop, daemon=True)
+            sweeper.start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(max(1.0, self.idle_timeout / 2))
+            self.unload_idle()
+
+    def acquire(self, kind, name, loader, task=None, dtype=None, device=None):
+        '''Returns the shared instance for the key, calling loader() to build it the first time
+        every acquire should be matched by a release(instance)'''
+        key = (kind, name, task, str(dtype) if dtype is not None else None,
+               str(device) if device is not None else None)
+        while True:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None:
+                    entry.refs += 1
+                    entry.last_used = time.monotonic()
+                    self._enforce_limits()
+                    return entry.instance
+                done = self.loading.get(key)
+                if done is None:
+                    # Nobody is loading it, this thread does
+                    done = self.loading[key] = threading.Event()
+                    break
+            # Another thread is loading it, wait and look again (it may have failed)
+            done.wait()
+
+        try:
+            instance = loader()
+            entry = _Entry(key, instance, *_model_weights(instance))
+        except BaseException:
+            with self.lock:
+                del self.loading[key]
+            done.set()
+            raise
+        with self.lock:
+            entry.refs = 1
+            self.entries[key] = entry
+            del self.loading[key]
+            self._enforce_limits()
+        done.set()
+        return instance
+
+    def release(self, instance):
+        '''Drops one reference to a model handed out by acquire'''
+        with self.lock:
+            for entry in self.entries.values():
+                if entry.instance is instance:
+                    entry.refs = max(0, entry.refs - 1)
+                    entry.last_used = time.monotonic()
+                    break
+            self._enforce_limits()
+
+    # Helpers for the model types this project uses
+    def pipeline(self, task, model, dtype=None, device=None):
+        def load():
+            from transformers import pipeline
+            kwargs = {}
+            if dtype is not None:
+                kwargs["torch_dtype"] = dtype
+            if device is not None:
+                kwargs["device"] = device
+            return pipeline(task, model=model, **kwargs)
+        return self.acquire("pipeline", model, load, task=task, dtype=dtype, device=device)
+
+    def tokenizer(self, name):
+        def load():
+            from transformers import AutoTokenizer
+            return AutoTokenizer.from_pretrained(name)
+        return self.acquire("tokenizer", name, load)
+
+    def sentence_transformer(self, name, device=None):
+        def load():
+            from sentence_transformers import SentenceTransformer
+            return SentenceTransformer(name, device=device)
+        return self.acquire("sentence_transformer", name, load, device=device)
+
+    def unload_idle(self, force=False):
+        '''Unloads unreferenced models that have been idle longer than idle_timeout
+        force unloads every unreferenced model regardless of idle time'''
+        with self.lock:
+            now = time.monotonic()
+            for key, entry in list(self.entries.items()):
+                if entry.refs > 0:
+                    continue
+                if force or (self.idle_timeout is not None and now - entry.last_used >= self.idle_timeout):
+                    self._unload(key)
+
+    def total_bytes(self, include_gpu=True):
+        '''Weight bytes of the loaded models, include_gpu=False counts only weights in RAM'''
+        with self.lock:
+            return sum(entry.weight_bytes for entry in self.entries.values()
+                       if include_gpu or not _on_gpu(entry.device))
+
+    def report(self):
+        '''Returns a list of dicts describing each loaded model, its weight size and the device
+        the weights are on'''
+        with self.lock:
+            now = time.monotonic()
+            return [{
+                "kind": entry.key[0],
+                "name": entry.key[1],
+                "task": entry.key[2],
+                "dtype": entry.key[3],
+                "device": entry.device,
+                "refs": entry.refs,
+                "weight_bytes": entry.weight_bytes,
+                "idle_seconds": now - entry.last_used if entry.refs == 0 else 0.0,
+            } for entry in self.entries.values()]
+
+    def print_report(self):
+        for row in self.report():
+            task = f" ({row['task']})" if row["task"] else ""
+            print(f"{row['kind']:<22} {row['name']}{task}: {row['weight_bytes'] / 1024**2:.1f} MB weights "
+                  f"on {row['device'] or 'cpu'}, refs={row['refs']}")
+        print(f"Weights: {self.total_bytes(include_gpu=False) / 1024**2:.1f} MB in RAM, "
+              f"{(self.total_bytes() - self.total_bytes(include_gpu=False)) / 1024**2:.1f} MB on GPU")
+        if self.memory_budget is not None:
+            print(f"RAM budget: {self.memory_budget / 1024**2:.1f} MB")
+
+    def _enforce_limits(self):
+        self.unload_idle()
+        if self.memory_budget is None:
+            return
+        # Evict least recently used unreferenced models in RAM until we fit the budget
+        idle = sorted((e for e in self.entries.values() if e.refs == 0 and not _on_gpu(e.device)),
+                      key=lambda e: e.last_used)
+        for entry in idle:
+            if self.total_bytes(include_gpu=False) <= self.memory_budget:
+                break
+            self._unload(entry.key)
+        if self.total_bytes(include_gpu=False) > self.memory_budget:
+            print(f"Warning: model weights in RAM use {self.total_bytes(include_gpu=False) / 1024**2:.1f} MB, "
+                  f"over the {self.memory_budget / 1024**2:.1f} MB budget")
+
+    def _unload(self, key):
+        del self.entries[key]
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+
+def _on_gpu(device):
+    return device is not None and device != "cpu"
+
+
+def _model_weights(instance):
+    '''Returns (bytes, device) of the weights and buffers of a model, device being the torch
+    device type ("cpu", "cuda", ...) of the first parameter.
+    (0, None) for things without torch weights, like tokenizers'''
+    module = instance
+    if not hasattr(module, "parameters"):
+        # transformers pipelines hold the torch module in .model
+        module = getattr(instance, "model", None)
+    if module is None or not hasattr(module, "parameters"):
+        return 0, None
+    nbytes = 0
+    device = None
+    try:
+        for p in module.parameters():
+            nbytes += p.numel() * p.element_size()
+            if device is None:
+                device = getattr(getattr(p, "device", None), "type", "cpu")
+        for b in module.buffers():
+            nbytes += b.numel() * b.element_size()
+    except Exception:
+        return 0, None
+    return nbytes, device
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def _setting(env_name, profile_key):
+    '''Reads a registry setting from the environment, falling back to the tuning profile'''
+    value = os.environ.get(env_name)
+    if value:
+        return float(value)
+    from gpu_check import get_profile
+    return get_profile().get(profile_key)
+
+
+def get_registry(idle_timeout=None, memory_budget=None):
+    '''Returns the process-wide registry, creating it on first use
+    idle_timeout (seconds) and memory_budget (bytes) only apply to the call that creates it.
+    When not given they come from STORYTELLER_MODEL_IDLE_TIMEOUT / STORYTELLER_MODEL_MEMORY_BUDGET_MB,
+    or the model_idle_timeout / model_memory_budget_mb keys of the tuning profile'''
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            if idle_timeout is None:
+                idle_timeout = _setting("STORYTELLER_MODEL_IDLE_TIMEOUT", "model_idle_timeout")
+            if memory_budget is None:
+                budget_mb = _setting("STORYTELLER_MODEL_MEMORY_BUDGET_MB", "model_memory_budget_mb")
+                memory_budget = int(budget_mb * 1024**2) if budget_mb is not None else None
+            _registry = ModelRegistry(idle_timeout=idle_timeout, memory_budget=memory_budget)
+        return _registry
+
+
+if __name__ == "__main__":
+    registry = get_registry()
+
+    summarizer = registry.pipeline("summarization", "facebook/bart-large-cnn")
+    again = registry.pipeline("summarization", "facebook/bart-large-cnn")
+    print(f"Same instance: {summarizer is again}")
+
+    embedder = registry.sentence_transformer("all-MiniLM-L6-v2")
+    registry.print_report()
+
+    registry.release(summarizer)
+    registry.release(again)
+    registry.release(embedder)
+    registry.unload_idle(force=True)
+    registry.print_report()
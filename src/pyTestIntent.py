@@ -1,16 +1,24 @@
 # intent_parser.py
 
 # REQUIRES NUMPY 1.26.0
-from transformers import pipeline
 import spacy
 import spacy.cli
 
+from gpu_check import get_profile
+from modelRegistry import get_registry
+
 # Download spaCy model
 spacy.cli.download("en_core_web_sm")
 
 # Load NLP models
 nlp = spacy.load("en_core_web_sm") # noun extractor model we want to use
-classifier = pipeline("zero-shot-classification") # intent classifier model from huggingface
+# intent classifier model from huggingface (the zero-shot default), shared through the model registry.
+# Acquired per call in classify_intent so the registry can unload it when idle
+registry = get_registry()
+
+def get_classifier():
+    return registry.pipeline("zero-shot-classification", "facebook/bart-large-mnli",
+                             device=get_profile()["device"])
 
 # Define possible intents
 intents = [    
@@ -33,7 +41,11 @@ def extract_nouns(text):
 def classify_intent(text):
     # Use the hugging face pipeline to classify the intent of the text
     # possible intents are defined in the intents list above
-    result = classifier(text, candidate_labels=intents)
+    classifier = get_classifier()
+    try:
+        result = classifier(text, candidate_labels=intents)
+    finally:
+        registry.release(classifier)
 
     # result is a dict with the keys "labels" and "scores"
     # return the result label with the highest score
@@ -0,0 +1,181 @@
+import re
+import time
+
+from metrics import LatencyTracker
+
+# Max tokens to generate per turn, by intent. Same intent labels as pyTestIntent.py,
+# plus Talk, and Opening for the first turn that sets up the story
+TOKEN_BUDGETS = {
+    "Opening": 768,
+    "Unknown": 512,
+    "Examine": 384,
+    "Talk": 384,
+    "Move": 320,
+    "Use": 256,
+    "Take": 192,
+    "Drop": 192,
+    "Inventory": 128,
+}
+
+# Cheap keyword intent detection, no model needed on the hot path
+INTENT_KEYWORDS = {
+    "Inventory": r"inventory|my items|what do i have|what am i carrying",
+    "Move": r"go|walk|run|head|move|climb|enter|leave|travel|follow|north|south|east|west",
+    "Talk": r"talk|ask|say|speak|tell|greet|shout|whisper|reply|answer",
+    "Examine": r"look|examine|inspect|search|check|read|observe|study|describe|what is",
+    "Take": r"take|grab|pick up|steal|collect|loot",
+    "Drop": r"drop|throw away|discard|put down",
+    "Use": r"use|open|unlock|light|attack|eat|drink|wear|equip|push|pull|cast",
+}
+
+# Phrases that ask about the inventory. They win over the verb rule: "check my inventory" or
+# "what is in my backpack" are inventory requests even though "check"/"what is" comes first.
+# Just mentioning a bag ("put the torch in my bag") is not, that is left to the verb rule
+PRIORITY_INTENTS = {
+    "Inventory": r"inventory|what do i have|what am i carrying|what(?:'s| is) in my"
+                 r"|(?:look|check|search) (?:in |inside |through )?my (?:bag|backpack|pockets)",
+}
+
+# The model would go on to write the player's next turn after these
+STOP_SEQUENCES = ["Prompt from user:", "\nUser:", "\nPlayer:", "<|im_end|>", "<|im_start|>"]
+
+# Once this fraction of the budget is used, stop at the next sentence end
+SOFT_LIMIT = 0.8
+
+# . ! ? or an ellipsis, optionally followed by closing quotes/brackets, where the next
+# sentence starts with a capital letter or the text ends. The word before is captured
+# so a period after an abbreviation ("Mr. Smith") isn't taken as a sentence end
+SENTENCE_END = re.compile(r'(\w*)([.!?…]+)["\'”’)\]*]*(?=\s+["\'“‘(\[*]*[A-Z]|\s*$)')
+
+# Lowercase, without the period
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "st", "mt", "sr", "jr", "prof", "capt", "lt", "sgt",
+                 "gen", "col", "rev", "vs", "etc", "ft", "no"}
+
+
+def sentence_ends(text):
+    '''Returns the positions just after each complete sentence in text'''
+    return [match.end() for match in SENTENCE_END.finditer(text)
+            if not (match.group(2) == "." and match.group(1).lower() in ABBREVIATIONS)]
+
+
+def _ends_sentence(text):
+    ends = sentence_ends(text)
+    return len(ends) > 0 and ends[-1] == len(text.rstrip())
+
+
+class ResponseGovernor:
+    '''Chooses a token budget and stop sequences per turn, ends the generation at a
+    sentence boundary once the budget is nearly used, and keeps stats on generated
+    tokens and generation time'''
+
+    def __init__(self, budgets=None, stop=None, soft_limit=SOFT_LIMIT):
+        self.budgets = {**TOKEN_BUDGETS, **(budgets or {})}
+        self.stop = STOP_SEQUENCES if stop is None else stop
+        self.soft_limit = soft_limit
+        self.patterns = {intent: re.compile(rf"\b(?:{words})\b", re.IGNORECASE)
+                         for intent, words in INTENT_KEYWORDS.items()}
+        self.priority_patterns = {intent: re.compile(rf"\b(?:{words})\b", re.IGNORECASE)
+                                  for intent, words in PRIORITY_INTENTS.items()}
+
+        self.tokens = LatencyTracker("Generated tokens", unit=" tok")
+        self.gen_time = LatencyTracker("Generation time", unit="s")
+        self.tokens_by_intent = {}
+        self.cut_short = 0
+
+    def detect_intent(self, prompt, first_turn=False):
+        '''Returns the intent label for the player input
+        priority phrases win outright, otherwise the intent whose keyword appears first wins,
+        since commands usually lead with the verb'''
+        if first_turn:
+            return "Opening"
+        for intent, pattern in self.priority_patterns.items():
+            if pattern.search(prompt):
+                return intent
+        best, best_pos = "Unknown", None
+        for intent, pattern in self.patterns.items():
+            match = pattern.search(prompt)
+            if match and (best_pos is None or match.start() < best_pos):
+                best, best_pos = intent, match.start()
+        return best
+
+    def options(self, intent):
+        '''Ollama options for this turn'''
+        return {
+            "num_predict": self.budgets.get(intent, self.budgets["Unknown"]),
+            "stop": self.stop,
+        }
+
+    def collect(self, stream, intent):
+        '''Reads a streamed chat response and returns the generated text
+        stream is the generator from ollama chat(..., stream=True)'''
+        budget = self.budgets.get(intent, self.budgets["Unknown"])
+        soft_budget = int(budget * self.soft_limit)
+
+        start = time.perf_counter()
+        content = ""
+        chunks = 0
+        tokens = None
+        done_reason = None
+        for chunk in stream:
+            content += chunk["message"]["content"]
+            chunks += 1
+            if chunk.get("done"):
+                tokens = chunk.get("eval_count")
+                done_reason = chunk.get("done_reason")
+                break
+            # Close to the budget: stop as soon as a sentence is complete.
+            # Closing the stream below stops the generation on the server
+            if chunks >= soft_budget and _ends_sentence(content):
+                done_reason = "sentence"
+                break
+        if hasattr(stream, "close"):
+            stream.close()
+        seconds = time.perf_counter() - start
+
+        if done_reason == "length":
+            # Ran out of budget mid-sentence, drop the unfinished part
+            content = self.trim(content)
+            self.cut_short += 1
+
+        # Each streamed chunk is one token when the final counts aren't available
+        self.record(intent, tokens if tokens is not None else chunks, seconds)
+        return content
+
+    def trim(self, text):
+        '''Cuts text after its last complete sentence, unchanged if there is none'''
+        ends = sentence_ends(text)
+        if not ends:
+            return text
+        return text[:ends[-1]]
+
+    def record(self, intent, tokens, seconds):
+        self.tokens.record(tokens)
+        self.gen_time.record(seconds)
+        if intent not in self.tokens_by_intent:
+            self.tokens_by_intent[intent] = LatencyTracker(f"  {intent}", unit=" tok")
+        self.tokens_by_intent[intent].record(tokens)
+
+    def report(self):
+        lines = [self.tokens.report(), self.gen_time.report()]
+        lines += [tracker.report() for tracker in self.tokens_by_intent.values()]
+        lines.append(f"Turns cut at the token budget: {self.cut_short}")
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    governor = ResponseGovernor()
+
+    inputs = [
+        "Go north towards the forest",
+        "Take the rusty key",
+        "Talk to the mysterious stranger",
+        "Look at the ancient chest",
+        "Use the key to unlock the door",
+        "Show me my inventory",
+        "I wait",
+    ]
+    for text in inputs:
+        intent = governor.detect_intent(text)
+        print(f"{text!r}: {intent}, {governor.options(intent)['num_predict']} tokens")
+
+    print(governor.trim('The door creaks open. "Who goes there?" a voice calls. You step'))
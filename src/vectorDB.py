@@ -1,26 +1,55 @@
 # pip install transformers sentence-transformers faiss-cpu
 
-from transformers import pipeline, AutoTokenizer
-from sentence_transformers import SentenceTransformer
-import faiss
 import numpy as np
 
+from embeddingStore import EmbeddingIndex, PackedStrings
+from gpu_check import get_profile
+from modelRegistry import get_registry
+
 class VectorDB:
-    def __init__(self):
-        # HuggingFace summarization pipeline
-        self.summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
+    def __init__(self, storage=None, vector_path=None):
+        '''storage picks how embeddings are kept: "flat", "fp16", "sq8" or "ivfpq"
+        (see embeddingStore.py). Defaults to the tuning profile's choice
+        vector_path is where ivfpq keeps its exact vectors, a temp file if not given'''
 
-        # Sentence embedding model
-        self.embedder = SentenceTransformer('all-MiniLM-L6-v2')
+        # Hardware tuning profile: device placement, batch size and index backend
+        self.profile = get_profile()
+        self.device = self.profile["device"]
+
+        # Models are shared through the registry so other components reuse the same instances.
+        # They are only held during a call, so the registry can unload them when idle.
+        # Load them now so the first turn doesn't pay for it
+        self.registry = get_registry()
+        self.registry.release(self._summarizer())
+        self.registry.release(self._embedder())
 
-        # Tokenizer for token length check
-        self.tokenizer = AutoTokenizer.from_pretrained("facebook/bart-large-cnn")
+        # Stores actual summaries for lookup, packed into one UTF-8 buffer
+        self.summaries = PackedStrings()
 
         # FAISS index setup. MiniLM embedding creates a vector of length 384
-        self.summaries = []  
-        self.res = faiss.StandardGpuResources()
-        # Stores actual summaries for lookup
-        self.index = faiss.GpuIndexFlatL2(self.res, 384)
+        # Only the flat float32 index runs on the GPU, compressed modes are for RAM savings on CPU
+        if storage is None:
+            storage = self.profile.get("embedding_storage", "flat")
+        self.index = EmbeddingIndex(384, storage=storage,
+                                    use_gpu=self.profile["index_backend"] == "faiss-gpu",
+                                    vector_path=vector_path)
+
+    def _summarizer(self):
+        # HuggingFace summarization pipeline
+        return self.registry.pipeline("summarization", "facebook/bart-large-cnn", device=self.device)
+
+    def _embedder(self):
+        # Sentence embedding model
+        return self.registry.sentence_transformer('all-MiniLM-L6-v2', device=self.device)
+
+    def encode(self, texts):
+        '''Returns the MiniLM embeddings of a list of strings as a float32 array'''
+        embedder = self._embedder()
+        try:
+            embeddings = embedder.encode(list(texts), batch_size=self.profile["embed_batch_size"])
+        finally:
+            self.registry.release(embedder)
+        return np.array(embeddings, dtype='float32')
 
     # Text is generated from the language model, summarize and put into vdb
     def add_text(self, text):
@@ -28,28 +57,50 @@ class VectorDB:
         text is a string (should be output from the language model)
         '''
 
-        # Tokenize the input text and get the token count
-        tokenized_input = self.tokenizer.encode(text)
-        token_count = len(tokenized_input)
-        
-        # If the input is too short (e.g., less than 30 tokens), do not summarize
-        if token_count < 30:
-            summary = text
-        else: # If the text is long enough, summarize this
-            summary = self.summarizer(text, min_length = 10, max_length = 30)[0]['summary_text']
+        summarizer = self._summarizer()
+        try:
+            # Tokenize the input text and get the token count.
+            # The pipeline already loaded the BART tokenizer
+            tokenized_input = summarizer.tokenizer.encode(text)
+            token_count = len(tokenized_input)
+
+            # If the input is too short (e.g., less than 30 tokens), do not summarize
+            if token_count < 30:
+                summary = text
+            else: # If the text is long enough, summarize this
+                summary = summarizer(text, min_length = 10, max_length = 30)[0]['summary_text']
+        finally:
+            self.registry.release(summarizer)
 
         # Create a vector based on the summary
-        sum_embedding = self.embedder.encode([summary])
+        sum_embedding = self.encode([summary])
 
         # Add the summary embedding to faiss
         self.index.add(np.array(sum_embedding, dtype='float32'))
 
-        # Keep a list of summaries. Stored as a string
+        # Keep a list of summaries. Stored in the packed buffer
         self.summaries.append(summary)
 
         # Return the summarized text
         return summary
 
+    def add_summaries(self, summaries):
+        '''Adds already summarized text to the vdb without running the summarizer
+        summaries is a list of strings (e.g. replaying a previous session)'''
+
+        if len(summaries) == 0:
+            return
+
+        # Encode all the summaries in one batch
+        sum_embeddings = self.encode(summaries)
+
+        self.index.add(np.array(sum_embeddings, dtype='float32'))
+        self.summaries.extend(summaries)
+
+    def close(self):
+        '''Frees the index. Models are only held during calls, so there is nothing to release'''
+        self.index.close()
+
     # Query with the player input
     def query(self, text, top_k = 3):
         '''Returns summaries that are similar to the text
@@ -64,11 +115,8 @@ class VectorDB:
         # dynamically adjusts the top_k based on how many entries
         top_k = min(top_k, len(self.summaries))
 
-        # Get the embedding of input text
-        txt_embedding = self.embedder.encode([text])
-
-        # Make the embedding of the input text a np array
-        txt_embedding_np = np.array(txt_embedding, dtype='float32')
+        # Get the embedding of input text as a np array
+        txt_embedding_np = self.encode([text])
 
         # Query the vdb, returning the top_k elements that are similar to the input text
         D, I = self.index.search(txt_embedding_np, top_k)
@@ -76,7 +124,8 @@ class VectorDB:
         # List comprehension, fetching all the summaries 
         # index is in I, and self.summaries store the text summaries
         # Append this to the prompt to the language model
-        return [self.summaries[i] for i in I[0]]
+        # Compressed indexes can return -1 for empty slots, skip those
+        return [self.summaries[i] for i in I[0] if i >= 0]
 
 
 if __name__ == "__main__":
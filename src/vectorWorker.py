@@ -0,0 +1,289 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+from embeddingStore import PackedStrings, remove_stale_files
+
+
+# Runs inside the worker process. Everything CPU heavy (BART, MiniLM, FAISS and
+# optionally the BERT extractor) is loaded here so it never competes for the GIL
+# with the Textual event loop.
+def _worker_main(conn, with_nlu, storage, vector_path, db_factory=None):
+    try:
+        if db_factory is not None:
+            vdb = db_factory()
+        else:
+            from vectorDB import VectorDB
+            vdb = VectorDB(storage=storage, vector_path=vector_path)
+        extractor = None
+        if with_nlu:
+            from BertContextExtractor import BertContextExtractor
+            extractor = BertContextExtractor()
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+        return
+
+    conn.send(("ok", os.getpid()))
+
+    while True:
+        try:
+            cmd, args = conn.recv()
+        except (EOFError, OSError):
+            # parent went away
+            break
+
+        if cmd == "stop":
+            break
+
+        try:
+            if cmd == "ping":
+                result = os.getpid()
+            elif cmd == "add_text":
+                result = vdb.add_text(*args)
+            elif cmd == "add_summaries":
+                result = vdb.add_summaries(*args)
+            elif cmd == "query":
+                result = vdb.query(*args)
+            elif cmd == "encode":
+                result = _share_array(vdb.encode(args[0]))
+            elif cmd == "extract":
+                if extractor is None:
+                    raise RuntimeError("worker was started without the NLU models")
+                result = extractor.extract(*args)
+            else:
+                raise ValueError(f"unknown command '{cmd}'")
+            conn.send(("ok", result))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+    vdb.close()
+
+
+def _share_array(arr):
+    '''Copies an embedding array into a new shared memory block
+    returns (name, shape, dtype) so the other process can map it without pickling the data'''
+    arr = np.ascontiguousarray(arr, dtype='float32')
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+    handle = (shm.name, arr.shape, arr.dtype.str)
+    shm.close()
+    return handle
+
+
+def _take_array(handle):
+    '''Reads an array written by _share_array and frees the shared memory block'''
+    name, shape, dtype = handle
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+# Seconds a single call (summarize + embed, or a query) may take before the worker is
+# considered hung and restarted
+DEFAULT_CALL_TIMEOUT = 120
+
+
+class VectorDBWorker:
+    '''Drop-in replacement for VectorDB that hosts the models in a separate process.
+    add_text and query have the same signatures as VectorDB, calls go over a pipe.
+    If the worker dies or stops answering it is restarted and the summaries added
+    so far are replayed into the new index.'''
+
+    def __init__(self, with_nlu=False, storage=None, call_timeout=DEFAULT_CALL_TIMEOUT,
+                 health_interval=30, health_timeout=10, db_factory=None):
+        # spawn instead of fork so CUDA/FAISS state is never copied from the UI process
+        self.ctx = mp.get_context("spawn")
+        self.with_nlu = with_nlu
+        self.storage = storage
+        # A call that takes longer than this is treated as a hung worker and restarts it
+        self.call_timeout = call_timeout
+        self.health_timeout = health_timeout
+        # Module level callable that builds the db in the worker instead of VectorDB (used by tests)
+        self.db_factory = db_factory
+
+        # Kept in the parent so the index can be rebuilt after a restart
+        self.summaries = PackedStrings()
+        self.restarts = 0
+
+        # The parent owns the worker's side files, a killed worker can't clean up after itself.
+        # A restarted worker reuses (and truncates) the same path
+        remove_stale_files()
+        self.vector_dir = tempfile.mkdtemp(prefix=f"storyteller-worker-{os.getpid()}-")
+        self.vector_path = os.path.join(self.vector_dir, "vectors.f32")
+
+        self.lock = threading.Lock()
+        self.process = None
+        self.conn = None
+        self._closed = False
+        try:
+            self._start()
+        except Exception:
+            shutil.rmtree(self.vector_dir, ignore_errors=True)
+            raise
+
+        # Background health checks
+        self.health_interval = health_interval
+        self._stop_event = threading.Event()
+        if health_interval:
+            self._monitor = threading.Thread(target=self._monitor_loop, daemon=True)
+            self._monitor.start()
+
+    def _start(self, timeout=None):
+        '''Starts the worker and replays the summaries into it
+        timeout bounds the wait for the worker to answer, None waits as long as the models take'''
+        parent_conn, child_conn = self.ctx.Pipe()
+        self.process = self.ctx.Process(target=_worker_main, args=(child_conn, self.with_nlu, self.storage,
+                                                                    self.vector_path, self.db_factory),
+                                        daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+        # Wait for the models to load. The first start has no timeout since it may download
+        # checkpoints, a restart does since it runs with self.lock held
+        if not self.conn.poll(timeout):
+            self._kill()
+            raise TimeoutError(f"Vector DB worker did not start within {timeout}s")
+        status, result = self.conn.recv()
+        if status != "ok":
+            self._kill()
+            raise RuntimeError(f"Vector DB worker failed to start: {result}")
+
+        # Rebuild the index after a restart
+        if len(self.summaries) > 0:
+            self.conn.send(("add_summaries", (list(self.summaries),)))
+            if not self.conn.poll(timeout):
+                self._kill()
+                raise TimeoutError(f"Vector DB worker did not restore summaries within {timeout}s")
+            status, result = self.conn.recv()
+            if status != "ok":
+                raise RuntimeError(f"Vector DB worker failed to restore summaries: {result}")
+
+    def _kill(self):
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        if self.conn is not None:
+            self.conn.close()
+
+    def _restart(self):
+        print("Restarting vector DB worker...")
+        self._kill()
+        self.restarts += 1
+        # Models are cached on disk by now, a worker that takes longer than a call to come
+        # back is treated as hung
+        self._start(timeout=self.call_timeout)
+
+    def _request(self, cmd, args, timeout):
+        self.conn.send((cmd, args))
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"Vector DB worker did not answer '{cmd}' within {timeout}s")
+        return self.conn.recv()
+
+    def _call(self, cmd, *args):
+        with self.lock:
+            if self._closed:
+                raise RuntimeError("Vector DB worker is closed")
+            # Try once, and once more on a fresh worker if the first one died
+            for attempt in range(2):
+                if not self.process.is_alive():
+                    self._restart()
+                try:
+                    status, result = self._request(cmd, args, self.call_timeout)
+                except TimeoutError:
+                    # The hung worker would still send its late reply into this pipe and it would
+                    # be read as the answer to the next command, so replace the worker first.
+                    # Not retried, the same input would most likely hang again
+                    self._restart()
+                    raise
+                except (EOFError, BrokenPipeError, ConnectionResetError):
+                    self._restart()
+                    if attempt == 1:
+                        raise
+                    continue
+                if status != "ok":
+                    raise RuntimeError(result)
+                return result
+
+    def add_text(self, text):
+        summary = self._call("add_text", text)
+        self.summaries.append(summary)
+        return summary
+
+    def add_summaries(self, summaries):
+        self._call("add_summaries", list(summaries))
+        self.summaries.extend(summaries)
+
+    def query(self, text, top_k = 3):
+        return self._call("query", text, top_k)
+
+    def encode(self, texts):
+        '''Returns MiniLM embeddings for a list of strings, passed back through shared memory'''
+        return _take_array(self._call("encode", list(texts)))
+
+    def extract(self, context):
+        '''BertContextExtractor.extract, only available when started with with_nlu=True'''
+        return self._call("extract", context)
+
+    def health_check(self):
+        '''Pings the worker and restarts it if it is dead or not answering
+        returns True if the worker was healthy'''
+        # A call in progress means the worker is busy. If it is hung, the call's own
+        # timeout restarts it
+        if not self.lock.acquire(timeout=self.health_timeout):
+            return self.process.is_alive()
+        try:
+            if self._closed:
+                return False
+            try:
+                if self.process.is_alive():
+                    status, _ = self._request("ping", (), self.health_timeout)
+                    if status == "ok":
+                        return True
+            except (EOFError, BrokenPipeError, ConnectionResetError, TimeoutError):
+                pass
+            self._restart()
+            return False
+        finally:
+            self.lock.release()
+
+    def _monitor_loop(self):
+        while not self._stop_event.wait(self.health_interval):
+            try:
+                self.health_check()
+            except Exception as e:
+                print(f"Warning: vector DB worker health check failed: {e}")
+
+    def close(self):
+        self._stop_event.set()
+        with self.lock:
+            if self._closed:
+                return
+            self._closed = True
+            try:
+                self.conn.send(("stop", ()))
+                self.process.join(timeout=5)
+            except (BrokenPipeError, OSError):
+                pass
+            self._kill()
+            shutil.rmtree(self.vector_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    worker = VectorDBWorker()
+
+    worker.add_text("The knight drew his sword and stepped into the dark cave, where a dragon slept on a pile of gold.")
+    worker.add_text("The merchant in the village sells healing potions and maps of the northern mountains.")
+    print(worker.query("Where is the dragon?"))
+    print(worker.encode(["a test sentence"]).shape)
+    print(f"Healthy: {worker.health_check()}")
+
+    worker.close()
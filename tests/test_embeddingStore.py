@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from embeddingStore import EmbeddingIndex, PackedStrings
+
+
+def _vectors(n, dim=384, seed=0):
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=(n, dim))
+    return (data / np.linalg.norm(data, axis=1, keepdims=True)).astype('float32')
+
+
+def test_packed_strings_behave_like_a_list():
+    texts = ["héllo", "", "wörld"]
+    packed = PackedStrings(texts)
+    assert len(packed) == 3
+    assert list(packed) == texts
+    assert packed[-1] == "wörld"
+    assert packed[np.int64(0)] == "héllo"
+    with pytest.raises(IndexError):
+        packed[3]
+
+
+@pytest.mark.parametrize("storage", ["flat", "fp16", "sq8", "ivfpq"])
+def test_small_index_finds_exact_match(storage):
+    index = EmbeddingIndex(384, storage)
+    data = _vectors(50)
+    for row in data:
+        index.add(row[None, :])
+    _, found = index.search(data[:5], 1)
+    assert list(found[:, 0]) == [0, 1, 2, 3, 4]
+    assert len(index) == 50
+    index.close()
+
+
+def test_sq8_trains_on_stored_vectors():
+    index = EmbeddingIndex(384, "sq8", train_size=300)
+    data = _vectors(400)
+    index.add(data[:299])
+    assert not index.index.is_trained
+
+    index.add(data[299:])
+    assert index.staging is None
+    assert index.index.ntotal == 400
+    _, found = index.search(data[:20], 1)
+    assert np.mean(found[:, 0] == np.arange(20)) >= 0.9
+
+
+def test_stale_side_files_are_removed(tmp_path):
+    import os
+    from embeddingStore import remove_stale_files
+
+    # pid 0x7ffffffe is far above any real pid, so its owner counts as gone
+    stale = tmp_path / "storyteller-vectors-2147483646-abc.f32"
+    stale.write_bytes(b"x")
+    stale_dir = tmp_path / "storyteller-worker-2147483646-abc"
+    stale_dir.mkdir()
+    live = tmp_path / f"storyteller-vectors-{os.getpid()}-abc.f32"
+    live.write_bytes(b"x")
+
+    remove_stale_files(str(tmp_path))
+    assert not stale.exists()
+    assert not stale_dir.exists()
+    assert live.exists()
@@ -0,0 +1,50 @@
+import subprocess
+
+import gpu_check
+
+
+def test_query_gpus_parses_nvidia_smi(monkeypatch):
+    output = "Tesla T4, 15360\nNVIDIA A100-SXM4-40GB, 40960\n"
+    monkeypatch.setattr(subprocess, "run",
+                        lambda *args, **kwargs: subprocess.CompletedProcess(args, 0, stdout=output, stderr=""))
+    assert gpu_check._query_gpus() == [
+        {"name": "Tesla T4", "memory_gb": 15.0},
+        {"name": "NVIDIA A100-SXM4-40GB", "memory_gb": 40.0},
+    ]
+
+
+def test_query_gpus_without_nvidia_smi(monkeypatch):
+    def missing(*args, **kwargs):
+        raise FileNotFoundError("nvidia-smi")
+    monkeypatch.setattr(subprocess, "run", missing)
+    assert gpu_check._query_gpus() == []
+
+
+def _caps(gpus, cuda):
+    return {"cpu_physical": 2, "cpu_logical": 2, "cuda": cuda, "gpus": gpus, "faiss_gpus": 0}
+
+
+def test_ollama_offload_follows_nvidia_smi_not_torch(monkeypatch):
+    monkeypatch.setattr(gpu_check, "_time_matmul", lambda batch, threads, repeats=5: 1.0 / threads)
+    # A GPU machine with a CPU-only torch still offloads the language model
+    profile = gpu_check.calibrate(_caps([{"name": "Tesla T4", "memory_gb": 15.0}], cuda=False))
+    assert profile["ollama_options"] == {"num_gpu": 99}
+    assert profile["device"] == "cpu"
+
+    # No GPU: let Ollama pick
+    assert gpu_check.calibrate(_caps([], cuda=False))["ollama_options"] == {}
+
+
+def test_query_gpus_skips_rows_that_dont_parse(monkeypatch):
+    output = "Tesla T4, 15360\nSome vGPU, [N/A]\nOther, [Not Supported]\ngarbage\n"
+    monkeypatch.setattr(subprocess, "run",
+                        lambda *args, **kwargs: subprocess.CompletedProcess(args, 0, stdout=output, stderr=""))
+    assert gpu_check._query_gpus() == [{"name": "Tesla T4", "memory_gb": 15.0}]
+
+
+def test_query_gpus_times_out(monkeypatch):
+    def stuck(*args, **kwargs):
+        assert kwargs.get("timeout") is not None
+        raise subprocess.TimeoutExpired("nvidia-smi", kwargs["timeout"])
+    monkeypatch.setattr(subprocess, "run", stuck)
+    assert gpu_check._query_gpus() == []
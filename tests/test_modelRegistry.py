@@ -0,0 +1,125 @@
+import threading
+import time
+
+import modelRegistry
+from modelRegistry import ModelRegistry
+
+
+class FakeDevice:
+    def __init__(self, type):
+        self.type = type
+
+
+class FakeParam:
+    def __init__(self, nbytes, device="cpu"):
+        self.nbytes = nbytes
+        self.device = FakeDevice(device)
+
+    def numel(self):
+        return self.nbytes
+
+    def element_size(self):
+        return 1
+
+
+class FakeModel:
+    def __init__(self, nbytes, device="cpu"):
+        self.weights = [FakeParam(nbytes, device)]
+
+    def parameters(self):
+        return self.weights
+
+    def buffers(self):
+        return []
+
+
+def test_same_key_is_shared_and_counted():
+    registry = ModelRegistry()
+    loads = []
+
+    def load():
+        loads.append(1)
+        return FakeModel(100)
+
+    first = registry.acquire("pipeline", "bart", load, task="summarization")
+    second = registry.acquire("pipeline", "bart", load, task="summarization")
+    assert first is second
+    assert len(loads) == 1
+    assert registry.report()[0]["refs"] == 2
+    assert registry.total_bytes() == 100
+
+
+def test_slow_load_only_blocks_same_key():
+    registry = ModelRegistry()
+    other = registry.acquire("pipeline", "other", lambda: FakeModel(10))
+    started, finish = threading.Event(), threading.Event()
+    loads = []
+
+    def slow_load():
+        loads.append(1)
+        started.set()
+        finish.wait(5)
+        return FakeModel(100)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.acquire("pipeline", "slow", slow_load)))
+               for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(5)
+
+    # Other models can be released and loaded while "slow" is loading
+    begin = time.monotonic()
+    registry.release(other)
+    registry.release(registry.acquire("pipeline", "fast", lambda: FakeModel(10)))
+    assert time.monotonic() - begin < 1
+
+    finish.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(loads) == 1
+    assert results[0] is results[1]
+    assert [row["refs"] for row in registry.report() if row["name"] == "slow"] == [2]
+
+
+def test_idle_unload_only_unreferenced():
+    registry = ModelRegistry(idle_timeout=0.05)
+    held = registry.acquire("pipeline", "held", lambda: FakeModel(10))
+    released = registry.acquire("pipeline", "released", lambda: FakeModel(10))
+    registry.release(released)
+
+    time.sleep(0.1)
+    registry.unload_idle()
+    assert [row["name"] for row in registry.report()] == ["held"]
+    registry.release(held)
+
+
+def test_memory_budget_evicts_least_recently_used():
+    registry = ModelRegistry(memory_budget=250)
+    for name in ("a", "b"):
+        registry.release(registry.acquire("pipeline", name, lambda: FakeModel(100)))
+    registry.acquire("pipeline", "c", lambda: FakeModel(100))
+
+    assert sorted(row["name"] for row in registry.report()) == ["b", "c"]
+
+
+def test_gpu_weights_not_counted_against_budget():
+    registry = ModelRegistry(memory_budget=150)
+    registry.release(registry.acquire("pipeline", "gpu", lambda: FakeModel(1000, "cuda")))
+    registry.release(registry.acquire("pipeline", "cpu", lambda: FakeModel(100)))
+
+    rows = {row["name"]: row for row in registry.report()}
+    assert rows["gpu"]["device"] == "cuda"
+    assert rows["gpu"]["weight_bytes"] == 1000
+    assert registry.total_bytes() == 1100
+    assert registry.total_bytes(include_gpu=False) == 100
+
+
+def test_get_registry_reads_environment(monkeypatch):
+    monkeypatch.setattr(modelRegistry, "_registry", None)
+    monkeypatch.setenv("STORYTELLER_MODEL_IDLE_TIMEOUT", "300")
+    monkeypatch.setenv("STORYTELLER_MODEL_MEMORY_BUDGET_MB", "2")
+
+    registry = modelRegistry.get_registry()
+    assert registry.idle_timeout == 300
+    assert registry.memory_budget == 2 * 1024**2
@@ -0,0 +1,75 @@
+import pytest
+
+from responseGovernor import ResponseGovernor
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("Go north towards the forest", "Move"),
+    ("Take the rusty key", "Take"),
+    ("Talk to the mysterious stranger", "Talk"),
+    ("Look at the ancient chest", "Examine"),
+    ("Use the key to unlock the door", "Use"),
+    ("I wait", "Unknown"),
+    # Inventory requests often start with an examine verb
+    ("Show me my inventory", "Inventory"),
+    ("Check my inventory", "Inventory"),
+    ("What is in my backpack?", "Inventory"),
+    ("Look in my bag", "Inventory"),
+    ("What am I carrying?", "Inventory"),
+    # Mentioning a bag is not asking about the inventory
+    ("Take the key and put it in my backpack", "Take"),
+    ("Drop the sword into my bag", "Drop"),
+    ("Put the torch in my pockets", "Unknown"),
+])
+def test_detect_intent(text, intent):
+    assert ResponseGovernor().detect_intent(text) == intent
+
+
+def test_first_turn_is_opening():
+    assert ResponseGovernor().detect_intent("Check my inventory", first_turn=True) == "Opening"
+
+
+def test_inventory_gets_smallest_budget():
+    governor = ResponseGovernor()
+    budget = governor.options(governor.detect_intent("Check my inventory"))["num_predict"]
+    assert budget == min(governor.budgets.values())
+
+
+def _stream(words, final=None):
+    for word in words:
+        yield {"message": {"content": word + " "}, "done": False}
+    if final is not None:
+        yield final
+
+
+def test_collect_stops_at_sentence_end_after_soft_limit():
+    governor = ResponseGovernor(budgets={"Take": 10})
+    words = "You grab the key. It is cold. The wind howls outside and the torch flickers. More".split(" ")
+    content = governor.collect(_stream(words), "Take")
+    assert content.rstrip().endswith("flickers.")
+
+
+def test_collect_trims_text_cut_by_budget():
+    governor = ResponseGovernor()
+    final = {"message": {"content": "You"}, "done": True, "done_reason": "length", "eval_count": 5}
+    content = governor.collect(_stream(["The", "door", "opens."], final), "Move")
+    assert content == "The door opens."
+    assert governor.cut_short == 1
+    assert governor.tokens.values == [5]
+
+
+@pytest.mark.parametrize("text, trimmed", [
+    ("He met Mr. Smith and", "He met Mr. Smith and"),
+    ("You see Dr. Reed. She waves at", "You see Dr. Reed."),
+    ('"Run!" she shouts. The', '"Run!" she shouts.'),
+    ("It costs 3.5 gold. You", "It costs 3.5 gold."),
+])
+def test_trim_ignores_abbreviations(text, trimmed):
+    assert ResponseGovernor().trim(text) == trimmed
+
+
+def test_collect_does_not_stop_after_abbreviation():
+    governor = ResponseGovernor(budgets={"Talk": 13})
+    words = "You greet the old man. He introduces himself as Mr. Hobb and smiles.".split(" ")
+    content = governor.collect(_stream(words), "Talk")
+    assert content.rstrip().endswith("smiles.")
@@ -0,0 +1,105 @@
+import os
+import time
+
+import pytest
+
+from vectorWorker import VectorDBWorker
+
+
+class FakeVectorDB:
+    '''Stands in for VectorDB inside the worker, "hang" makes a call never return'''
+
+    def __init__(self):
+        # Set by the test before a restart to make the new worker hang while starting
+        if os.environ.get("FAKE_DB_HANG_ON_START"):
+            time.sleep(60)
+        self.summaries = []
+
+    def add_text(self, text):
+        if text == "hang":
+            time.sleep(60)
+        self.summaries.append(text)
+        return text
+
+    def add_summaries(self, summaries):
+        self.summaries.extend(summaries)
+
+    def query(self, text, top_k = 3):
+        if text == "hang":
+            time.sleep(60)
+        return self.summaries[-top_k:]
+
+    def close(self):
+        pass
+
+
+def make_fake_db():
+    return FakeVectorDB()
+
+
+@pytest.fixture
+def worker():
+    worker = VectorDBWorker(call_timeout=2, health_interval=None, db_factory=make_fake_db)
+    yield worker
+    worker.close()
+
+
+def test_calls_round_trip(worker):
+    worker.add_text("the dragon sleeps")
+    assert worker.query("dragon") == ["the dragon sleeps"]
+    assert worker.health_check()
+
+
+def test_hung_call_restarts_worker(worker):
+    worker.add_text("the dragon sleeps")
+    old_pid = worker.process.pid
+
+    with pytest.raises(TimeoutError):
+        worker.query("hang")
+
+    # The hung worker was replaced and the summaries replayed into the new one
+    assert worker.restarts == 1
+    assert worker.process.pid != old_pid
+    assert worker.query("dragon") == ["the dragon sleeps"]
+
+
+def test_late_reply_is_not_read_by_next_call(worker):
+    with pytest.raises(TimeoutError):
+        worker.add_text("hang")
+
+    # The next call gets its own answer, not the reply the hung call would have sent
+    worker.add_text("a merchant sells maps")
+    assert worker.query("maps") == ["a merchant sells maps"]
+
+
+def test_dead_worker_is_restarted(worker):
+    worker.add_text("the dragon sleeps")
+    worker.process.kill()
+    worker.process.join()
+
+    assert worker.query("dragon") == ["the dragon sleeps"]
+    assert worker.restarts == 1
+
+
+def test_hung_restart_times_out(worker, monkeypatch):
+    worker.add_text("the dragon sleeps")
+    worker.process.kill()
+    worker.process.join()
+
+    # The replacement never finishes loading, the call gives up instead of blocking forever
+    monkeypatch.setenv("FAKE_DB_HANG_ON_START", "1")
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        worker.query("dragon")
+    assert time.monotonic() - start < 10
+
+    # Once it can start again the next call restarts it and replays the summaries
+    monkeypatch.delenv("FAKE_DB_HANG_ON_START")
+    assert worker.query("dragon") == ["the dragon sleeps"]
+
+
+def test_close_removes_side_files():
+    worker = VectorDBWorker(call_timeout=2, health_interval=None, db_factory=make_fake_db)
+    assert os.path.isdir(worker.vector_dir)
+    worker.close()
+    assert not os.path.exists(worker.vector_dir)